@@ -1,10 +1,11 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from db import create_tables
 from routers import categoria
 from routers import productos
 from routers import venta
 
-app = FastAPI(lifespan=create_tables,title="API de Gestión de Categorías", version="1.0.0")
+app = FastAPI(lifespan=create_tables,title="API de Gestión de Categorías", version="1.0.0", default_response_class=ORJSONResponse)
 
 app.include_router(categoria.router)
 app.include_router(productos.router)
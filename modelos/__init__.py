@@ -0,0 +1,11 @@
+from typing import List
+
+from modelos.categoria import Categoria, CategoriaConProductos
+from modelos.productos import Producto, ProductoLeer
+from modelos.venta import Venta, VentaItem
+
+# Resuelve las referencias adelantadas una única vez por proceso; los módulos
+# ya no se importan entre sí al final de cada archivo
+CategoriaConProductos.model_rebuild(
+    _types_namespace={"ProductoLeer": ProductoLeer, "List": List}
+)
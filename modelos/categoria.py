@@ -1,15 +1,22 @@
-from typing import Optional, List
+from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
+
+if TYPE_CHECKING:
+    from modelos.productos import Producto, ProductoLeer
 
 class CategoriaBase(SQLModel):
-    nombre: str
+    nombre: str = Field(index=True, unique=True)
     descripcion: Optional[str] = None
     fecha_creacion: datetime = Field(default_factory=datetime.utcnow)
     fecha_actualizacion: datetime = Field(default_factory=datetime.utcnow)
     activo: bool = True
 
 class Categoria(CategoriaBase, table=True):
+    # Índice para el filtro por estado de los endpoints de lectura
+    __table_args__ = (Index("ix_cat_activo", "activo"),)
+
     categoria_id: Optional[int] = Field(default=None, primary_key=True)
     productos: List["Producto"] = Relationship(back_populates="categoria")
     eliminacion: bool = True
@@ -30,7 +37,4 @@ class CategoriaLeer(SQLModel):
     activo: bool = True
 
 class CategoriaConProductos(CategoriaLeer):
-    productos: List["ProductoLeer"] = []
-
-
-from modelos.productos import Producto, ProductoLeer
\ No newline at end of file
+    productos: List["ProductoLeer"] = []
\ No newline at end of file
@@ -1,18 +1,36 @@
-from typing import Optional, List
+from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime, timezone, timedelta
 from sqlmodel import SQLModel, Field, Relationship
 
+from sqlalchemy import Index
+
+if TYPE_CHECKING:
+    from modelos.categoria import Categoria
+
+# Zona horaria local (UTC-5), construida una sola vez al importar el módulo
+BOGOTA_TZ = timezone(timedelta(hours=-5))
+
 class ProductoBase(SQLModel):
-    nombre: str
+    nombre: str = Field(index=True, unique=True)
     descripcion: Optional[str] = None
-    fecha_creacion: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=-5))))
-    fecha_actualizacion: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=-5))))
+    fecha_creacion: datetime = Field(default_factory=lambda: datetime.now(BOGOTA_TZ))
+    fecha_actualizacion: datetime = Field(default_factory=lambda: datetime.now(BOGOTA_TZ))
     activo: bool = True
     precio: Optional[float] = None
     stock: Optional[int] = None
     categoria_id: int = Field(default=None, foreign_key="categoria.categoria_id")
 
 class Producto(ProductoBase, table=True):
+    # Índices para los filtros calientes de los endpoints de lectura. El
+    # compuesto lleva categoria_id primero para servir también los filtros que
+    # sólo miran la categoría; el filtro que sólo mira activo usa ix_prod_activo
+    __table_args__ = (
+        Index("ix_prod_cat_activo", "categoria_id", "activo"),
+        Index("ix_prod_activo", "activo"),
+        Index("ix_prod_precio", "precio"),
+        Index("ix_prod_stock", "stock"),
+    )
+
     producto_id: Optional[int] = Field(default=None, primary_key=True)
     categoria: Optional["Categoria"] = Relationship(back_populates="productos")
     eliminacion: bool = True
@@ -29,13 +47,10 @@ class ProductoLeer(ProductoBase):
     producto_id: Optional[int] = Field(default=None, primary_key=True)
     nombre: str
     descripcion: Optional[str] = None
-    fecha_creacion: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=-5))))
-    fecha_actualizacion: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=-5))))
+    fecha_creacion: datetime = Field(default_factory=lambda: datetime.now(BOGOTA_TZ))
+    fecha_actualizacion: datetime = Field(default_factory=lambda: datetime.now(BOGOTA_TZ))
     activo: bool = True
     precio: Optional[float] = None
     stock: Optional[int] = None
     categoria_id: int = Field(default=None, foreign_key="categoria.categoria_id")
 
-
-from modelos.categoria import Categoria
-
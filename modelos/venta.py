@@ -1,7 +1,10 @@
-from typing import Optional, List
+from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
 
+if TYPE_CHECKING:
+    from modelos.productos import Producto
+
 class VentaItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     venta_id: Optional[int] = Field(default=None, foreign_key="venta.venta_id")
@@ -21,6 +24,11 @@ class Venta(SQLModel, table=True):
 
     items: List[VentaItem] = Relationship(back_populates="venta")
 
+class VentaItemCrear(SQLModel):
+    producto_id: int
+    cantidad: int
+
+
 class ProductoResponse(SQLModel):
     producto_id: int
     nombre: str
@@ -43,5 +51,6 @@ class VentaResponse(SQLModel):
     items: List[VentaItemResponse]
 
 
-
-from modelos.productos import Producto
+class VentaPagina(SQLModel):
+    items: List[VentaResponse]
+    next_cursor: Optional[int] = None
@@ -1,18 +1,40 @@
 from typing import List
-from fastapi import APIRouter, HTTPException, Form
-from datetime import datetime, timezone, timedelta
+from fastapi import APIRouter, HTTPException, Form, Query
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
 from db import SessionDep
 from modelos.categoria import Categoria, CategoriaLeer, CategoriaConProductos
-from modelos.productos import Producto
-from sqlalchemy.orm import selectinload
-from sqlmodel import select
+from modelos.productos import Producto, BOGOTA_TZ
+from routers.productos import _cache_listados
+from sqlalchemy import bindparam
+from sqlalchemy.orm import selectinload, raiseload
+from sqlmodel import select, update
 
 router = APIRouter(
     prefix="/categorias",
     tags=["categorias"],
 )
 
-@router.post("/", response_model=CategoriaLeer)
+# Columnas que expone CategoriaLeer, para proyectar en vez de traer filas completas
+_COLUMNAS_CATEGORIA = (
+    Categoria.categoria_id,
+    Categoria.nombre,
+    Categoria.descripcion,
+    Categoria.fecha_creacion,
+    Categoria.fecha_actualizacion,
+    Categoria.activo,
+)
+
+# Sentencia del listado caliente, construida una sola vez al importar el módulo
+_STMT_CATEGORIA_POR_ID = select(Categoria).where(Categoria.categoria_id == bindparam("id"))
+
+_STMT_CATEGORIAS_ACTIVAS = (
+    select(*_COLUMNAS_CATEGORIA)
+    .where(Categoria.activo == True)
+    .order_by(Categoria.categoria_id)
+)
+
+@router.post("/", response_model=CategoriaLeer, response_model_exclude_none=True)
 async def crear_categoria(session: SessionDep,
                           nombre: str = Form(...),
                           descripcion: str = Form(None),
@@ -41,23 +63,28 @@ async def crear_categoria(session: SessionDep,
         descripcion=descripcion,
         activo=activo
     )
-    categorias_comprobacion = session.query(Categoria).filter(Categoria.nombre==nueva_categoria.nombre).all()
-    if categorias_comprobacion:
-        raise HTTPException(status_code=400, detail="La categoría con ese nombre ya existe")
     session.add(nueva_categoria)
-    session.commit()
-    session.refresh(nueva_categoria)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="La categoría con ese nombre ya existe")
+    await session.refresh(nueva_categoria)
     return nueva_categoria
 
-@router.get("/", response_model=List[CategoriaLeer])
-async def leer_categorias(session: SessionDep):
+@router.get("/", response_model=List[CategoriaLeer], response_model_exclude_none=True)
+async def leer_categorias(session: SessionDep,
+                          limit: int = Query(50, le=500),
+                          offset: int = Query(0, ge=0)):
     """
     Leer categorías activas.
 
-    Obtiene todas las categorías marcadas como activas desde la base de datos.
+    Obtiene las categorías marcadas como activas desde la base de datos, paginadas.
 
     Args:
         session (SessionDep): Dependencia que provee la sesión de la base de datos.
+        limit (int): Cantidad máxima de categorías por página. Máximo 500.
+        offset (int): Cantidad de categorías a omitir desde el inicio.
 
     Returns:
         List[Categoria]: Lista de instancias de `Categoria` activas.
@@ -65,12 +92,12 @@ async def leer_categorias(session: SessionDep):
     Raises:
         HTTPException: 404 si no se encuentran categorías.
     """
-    categorias = session.query(Categoria).filter(Categoria.activo==True).all()
+    categorias = (await session.exec(_STMT_CATEGORIAS_ACTIVAS.limit(limit).offset(offset))).all()
     if not categorias:
         raise HTTPException(status_code=404, detail="No se encontraron categorías")
     return categorias
 
-@router.get("/categoria_id/{categoria_id}/", response_model=Categoria)
+@router.get("/categoria_id/{categoria_id}/", response_model=CategoriaLeer, response_model_exclude_none=True)
 async def leer_categoria_id(categoria_id: int, session: SessionDep):
     """
     Leer una categoría por ID.
@@ -82,17 +109,17 @@ async def leer_categoria_id(categoria_id: int, session: SessionDep):
         session (SessionDep): Dependencia que provee la sesión de la base de datos.
 
     Returns:
-        Categoria: Instancia de `Categoria` encontrada.
+        CategoriaLeer: Esquema de lectura de la categoría encontrada.
 
     Raises:
         HTTPException: 404 si la categoría no existe.
     """
-    categoria = session.get(Categoria, categoria_id)
+    categoria = (await session.exec(_STMT_CATEGORIA_POR_ID, params={"id": categoria_id})).one_or_none()
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return categoria
 
-@router.get("/activo/{activo}/", response_model=List[CategoriaLeer])
+@router.get("/activo/{activo}/", response_model=List[CategoriaLeer], response_model_exclude_none=True)
 async def leer_categorias_activo(activo: bool, session: SessionDep):
     """
     Leer categorías por estado activo.
@@ -109,12 +136,12 @@ async def leer_categorias_activo(activo: bool, session: SessionDep):
     Raises:
         HTTPException: 404 si no se encuentran categorías.
     """
-    categorias = session.query(Categoria).filter(Categoria.activo==activo).all()
+    categorias = (await session.exec(select(*_COLUMNAS_CATEGORIA).where(Categoria.activo==activo))).all()
     if not categorias:
         raise HTTPException(status_code=404, detail="No se encontraron categorías")
     return categorias
 
-@router.get("/{categoria_id}/productos/", response_model=CategoriaConProductos)
+@router.get("/{categoria_id}/productos/", response_model=CategoriaConProductos, response_model_exclude_none=True)
 async def leer_categoria_con_productos(categoria_id: int, session: SessionDep):
     """
     Leer una categoría junto con sus productos.
@@ -131,13 +158,13 @@ async def leer_categoria_con_productos(categoria_id: int, session: SessionDep):
     Raises:
         HTTPException: 404 si la categoría no existe.
     """
-    query = select(Categoria).options(selectinload(Categoria.productos).selectinload(Producto.categoria)).where(Categoria.categoria_id == categoria_id)
-    categoria = session.exec(query).first()
+    query = select(Categoria).options(selectinload(Categoria.productos).selectinload(Producto.categoria), raiseload("*")).where(Categoria.categoria_id == categoria_id)
+    categoria = (await session.exec(query)).first()
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return categoria
 
-@router.put("/{categoria_id}/", response_model=Categoria)
+@router.put("/{categoria_id}/", response_model=CategoriaLeer, response_model_exclude_none=True)
 async def actualizar_categoria(categoria_id: int,
                                session: SessionDep,
                                nombre: str = Form(None),
@@ -158,45 +185,56 @@ async def actualizar_categoria(categoria_id: int,
         activo (bool | None): Nuevo estado. Si es `None` no se modifica.
 
     Returns:
-        Categoria: Instancia de `Categoria` actualizada.
+        CategoriaLeer: Esquema de lectura de la categoría actualizada.
 
     Raises:
+        HTTPException: 400 si no se envía ningún campo a actualizar.
         HTTPException: 404 si la categoría no existe.
     """
-    categoria = session.get(Categoria, categoria_id)
-    if not categoria:
+    actualizaciones = {
+        campo: valor
+        for campo, valor in (("nombre", nombre), ("descripcion", descripcion), ("activo", activo))
+        if valor is not None
+    }
+    if not actualizaciones:
+        raise HTTPException(status_code=400, detail="No se enviaron campos para actualizar")
+
+    actualizaciones["fecha_actualizacion"] = datetime.now(BOGOTA_TZ)
+
+    try:
+        resultado = await session.exec(
+            update(Categoria).where(Categoria.categoria_id == categoria_id).values(**actualizaciones)
+        )
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="La categoría con ese nombre ya existe")
+    if resultado.rowcount == 0:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    await session.commit()
+    if "activo" in actualizaciones:
+        # Activar o desactivar la categoría cambia qué productos listan los
+        # endpoints que la joinean: los listados cacheados quedan viejos
+        _cache_listados.clear()
+    return await session.get(Categoria, categoria_id)
 
-    if nombre is not None:
-        categoria.nombre = nombre
-    if descripcion is not None:
-        categoria.descripcion = descripcion
-    if activo is not None:
-        categoria.activo = activo
 
-    categoria.fecha_actualizacion = datetime.now(timezone(timedelta(hours=-5)))
-
-    session.add(categoria)
-    session.commit()
-    session.refresh(categoria)
-    return categoria
-
-
-@router.delete("/{categoria_id}", response_model=Categoria)
+@router.delete("/{categoria_id}", response_model=CategoriaLeer, response_model_exclude_none=True)
 async def eliminar_categoria(categoria_id: int, session: SessionDep):
-    categoria = session.get(Categoria, categoria_id)
-    if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada")
-
-    for producto in categoria.productos:
-        producto.eliminacion = False
-        producto.eliminacion = False
-        producto.activo = False
-        producto.precio = 0
-        producto.stock = 0
-
-    categoria.eliminacion = False
-    categoria.activo = False
-    session.commit()
+    async with session.begin():
+        categoria = await session.get(Categoria, categoria_id)
+        if not categoria:
+            raise HTTPException(status_code=404, detail="Categoría no encontrada")
+
+        await session.exec(
+            update(Producto)
+            .where(Producto.categoria_id == categoria_id)
+            .values(eliminacion=False, activo=False, precio=0, stock=0,
+                    fecha_actualizacion=datetime.now(BOGOTA_TZ))
+        )
+
+        categoria.eliminacion = False
+        categoria.activo = False
+    # La baja desactiva productos en bloque: los listados cacheados quedan viejos
+    _cache_listados.clear()
     return categoria
 
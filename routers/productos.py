@@ -1,9 +1,15 @@
 from typing import List
-from datetime import datetime, timezone, timedelta
-from sqlmodel import select
-from fastapi import APIRouter, HTTPException, Form, Query
+from datetime import datetime
+import hashlib
+import orjson
+from cachetools import TTLCache
+from sqlmodel import select, insert, update
+from fastapi import APIRouter, HTTPException, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import bindparam, exists, func, literal
+from sqlalchemy.exc import IntegrityError
 from db import SessionDep
-from modelos.productos import Producto, ProductoLeer
+from modelos.productos import Producto, ProductoLeer, BOGOTA_TZ
 from modelos.categoria import Categoria
 
 router = APIRouter(
@@ -11,7 +17,44 @@ router = APIRouter(
     tags=["productos"],
 )
 
-@router.post("/", response_model=ProductoLeer)
+# Caché en memoria para los listados calientes: el catálogo cambia poco, así que
+# durante el TTL las lecturas repetidas no tocan la base de datos. Lo vacía toda
+# escritura que afecte qué productos se listan o con qué datos:
+# crear/actualizar/eliminar producto, eliminar categoría o cambiarle el estado
+# activo (ambos alteran la visibilidad de sus productos) y las ventas
+# (descuentan stock).
+_cache_listados = TTLCache(maxsize=256, ttl=30)
+
+
+def _etag_debil(*componentes) -> str:
+    """Construye un ETag débil a partir de los componentes que versionan la respuesta."""
+    base = ":".join(str(c) for c in componentes).encode()
+    return 'W/"%s"' % hashlib.blake2b(base).hexdigest()[:16]
+
+# Columnas que expone ProductoLeer, para proyectar en vez de traer filas completas
+_COLUMNAS_PRODUCTO = (
+    Producto.producto_id,
+    Producto.nombre,
+    Producto.descripcion,
+    Producto.fecha_creacion,
+    Producto.fecha_actualizacion,
+    Producto.activo,
+    Producto.precio,
+    Producto.stock,
+    Producto.categoria_id,
+)
+
+_STMT_PRODUCTO_POR_ID = select(Producto).where(Producto.producto_id == bindparam("id"))
+
+# Sentencia del listado caliente, construida una sola vez al importar el módulo
+_STMT_PRODUCTOS_ACTIVOS = (
+    select(*_COLUMNAS_PRODUCTO)
+    .join(Categoria)
+    .where(Producto.activo == True, Categoria.activo == True)
+    .order_by(Producto.producto_id)
+)
+
+@router.post("/", response_model=ProductoLeer, response_model_exclude_none=True)
 async def crear_producto(session: SessionDep,
                          nombre: str = Form(...),
                          descripcion: str = Form(None),
@@ -47,39 +90,88 @@ async def crear_producto(session: SessionDep,
     if stock is not None and stock < 0:
         raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
 
-    categoria = session.get(Categoria, categoria_id)
-
-    if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    # INSERT ... SELECT condicionado a que la categoría exista y esté activa:
+    # la validación viaja en la misma sentencia que el alta, así que no hay
+    # ventana en la que la categoría pueda desactivarse entre chequeo e insert
+    ahora = datetime.now(BOGOTA_TZ)
+    seleccion = (
+        select(
+            literal(nombre),
+            literal(descripcion),
+            literal(ahora),
+            literal(ahora),
+            literal(activo),
+            literal(precio),
+            literal(stock),
+            literal(categoria_id),
+            literal(True),
+        )
+        .where(exists(
+            select(Categoria.categoria_id).where(
+                Categoria.categoria_id == categoria_id,
+                Categoria.activo == True,
+            )
+        ))
+    )
+    sentencia = insert(Producto).from_select(
+        [
+            "nombre",
+            "descripcion",
+            "fecha_creacion",
+            "fecha_actualizacion",
+            "activo",
+            "precio",
+            "stock",
+            "categoria_id",
+            "eliminacion",
+        ],
+        seleccion,
+    ).returning(*_COLUMNAS_PRODUCTO)
+
+    try:
+        producto = (await session.exec(sentencia)).one_or_none()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="El producto con ese nombre ya existe")
 
-    if not categoria.activo:
+    if producto is None:
+        # Solo en el camino de error se consulta la categoría para diagnosticar
+        categoria = await session.get(Categoria, categoria_id)
+        if not categoria:
+            raise HTTPException(status_code=404, detail="Categoría no encontrada")
         raise HTTPException(status_code=400, detail="La categoría está inactiva")
 
+    await session.commit()
+    _cache_listados.clear()
+    return producto
 
-    nuevo_producto = Producto(
-        nombre=nombre,
-        descripcion=descripcion,
-        activo=activo,
-        precio=precio,
-        stock=stock,
-        categoria_id=categoria_id,
-    )
-    productos_comprobacion = session.query(Producto).filter(Producto.nombre==nuevo_producto.nombre).all()
-    if productos_comprobacion:
-        raise HTTPException(status_code=400, detail="El producto con ese nombre ya existe")
-    session.add(nuevo_producto)
-    session.commit()
-    session.refresh(nuevo_producto)
-    return nuevo_producto
-
-@router.get("/", response_model=List[ProductoLeer])
-async def leer_productos(session: SessionDep):
-    productos = (
-        session.query(Producto)
-        .join(Categoria)
-        .filter(Producto.activo == True, Categoria.activo == True)
-        .all()
-    )
+def _stream_productos(filas):
+    """Serializa las filas proyectadas como un arreglo JSON, elemento por elemento.
+
+    Emitir cada producto por separado evita construir la lista de modelos y el
+    documento JSON completo en memoria antes de enviar el primer byte.
+    """
+    yield b"["
+    primera = True
+    for fila in filas:
+        if not primera:
+            yield b","
+        yield orjson.dumps(dict(fila._mapping))
+        primera = False
+    yield b"]"
+
+
+# Sin response_model: las filas ya vienen proyectadas y se serializan en streaming
+@router.get("/", response_model=None)
+async def leer_productos(session: SessionDep,
+                         limit: int = Query(50, le=500),
+                         offset: int = Query(0, ge=0)):
+    clave = ("activos", limit, offset)
+    productos = _cache_listados.get(clave)
+    if productos is None:
+        productos = (await session.exec(_STMT_PRODUCTOS_ACTIVOS.limit(limit).offset(offset))).all()
+        if productos:
+            _cache_listados[clave] = productos
     """
         Leer productos activos.
 
@@ -96,9 +188,9 @@ async def leer_productos(session: SessionDep):
         """
     if not productos:
         raise HTTPException(status_code=404, detail="No se encontraron productos")
-    return productos
+    return StreamingResponse(_stream_productos(productos), media_type="application/json")
 
-@router.get("/precio/", response_model=List[ProductoLeer])
+@router.get("/precio/", response_model=List[ProductoLeer], response_model_exclude_none=True)
 async def leer_productos_por_precio(
     session: SessionDep,
     precio_min: int = Query(..., gt=0),
@@ -125,10 +217,10 @@ async def leer_productos_por_precio(
         raise HTTPException(
             status_code=400, detail="El precio mínimo no puede ser mayor que el precio máximo"
         )
-    consulta = select(Producto).where(
+    consulta = select(*_COLUMNAS_PRODUCTO).where(
         Producto.precio.between(precio_min, precio_max)
     )
-    productos = session.exec(consulta).all()
+    productos = (await session.exec(consulta)).all()
     if not productos:
         raise HTTPException(
             status_code=404,
@@ -136,7 +228,7 @@ async def leer_productos_por_precio(
         )
     return productos
 
-@router.get("/stock/", response_model=List[ProductoLeer])
+@router.get("/stock/", response_model=List[ProductoLeer], response_model_exclude_none=True)
 async def leer_productos_por_stock(
     session: SessionDep,
     stock_min: int = Query(..., gt=0),
@@ -163,10 +255,10 @@ async def leer_productos_por_stock(
         raise HTTPException(
             status_code=400, detail="El stock mínimo no puede ser mayor que el stock máximo"
         )
-    consulta = select(Producto).where(
+    consulta = select(*_COLUMNAS_PRODUCTO).where(
         Producto.stock.between(stock_min, stock_max)
     )
-    productos = session.exec(consulta).all()
+    productos = (await session.exec(consulta)).all()
     if not productos:
         raise HTTPException(
             status_code=404,
@@ -174,38 +266,23 @@ async def leer_productos_por_stock(
         )
     return productos
 
-@router.get("/{producto_id}/", response_model=ProductoLeer)
-async def leer_producto_por_id(producto_id: int, session: SessionDep):
-    """
-        Leer un producto por ID.
-
-        Recupera un producto específico a partir de su identificador.
-
-        Args:
-            producto_id (int): ID del producto a consultar.
-            session (SessionDep): Dependencia que provee la sesión de la base de datos.
-
-        Returns:
-            Producto: Instancia del producto correspondiente.
-
-        Raises:
-            HTTPException: 404 si el producto no existe.
-        """
-    producto = session.get(Producto, producto_id)
-    if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return producto
-
-@router.get("/categoria/{categoria_id}/", response_model=List[ProductoLeer])
-async def leer_productos_por_categoria(categoria_id: int, session: SessionDep):
+@router.get("/categoria/{categoria_id}/", response_model=List[ProductoLeer], response_model_exclude_none=True)
+async def leer_productos_por_categoria(categoria_id: int,
+                                       session: SessionDep,
+                                       request: Request,
+                                       response: Response,
+                                       limit: int = Query(50, le=500),
+                                       offset: int = Query(0, ge=0)):
     """
         Leer productos por categoría.
 
-        Obtiene todos los productos pertenecientes a una categoría específica.
+        Obtiene los productos pertenecientes a una categoría específica, paginados.
 
         Args:
             categoria_id (int): ID de la categoría a consultar.
             session (SessionDep): Dependencia que provee la sesión de la base de datos.
+            limit (int): Cantidad máxima de productos por página. Máximo 500.
+            offset (int): Cantidad de productos a omitir desde el inicio.
 
         Returns:
             List[Producto]: Lista de productos asociados a la categoría.
@@ -213,12 +290,34 @@ async def leer_productos_por_categoria(categoria_id: int, session: SessionDep):
         Raises:
             HTTPException: 404 si no se encuentran productos para la categoría indicada.
         """
-    productos = session.query(Producto).filter(Producto.categoria_id==categoria_id).all()
+    # Agregado barato (ix_prod_cat_activo lleva categoria_id primero) que versiona el resultado:
+    # si nada cambió desde la última respuesta, se contesta 304 sin consulta completa
+    max_actualizacion, total = (await session.exec(
+        select(func.max(Producto.fecha_actualizacion), func.count())
+        .where(Producto.categoria_id == categoria_id)
+    )).one()
+    etag = _etag_debil(categoria_id, limit, offset, max_actualizacion, total)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    clave = ("categoria", categoria_id, limit, offset)
+    productos = _cache_listados.get(clave)
+    if productos is None:
+        productos = (await session.exec(
+            select(*_COLUMNAS_PRODUCTO)
+            .where(Producto.categoria_id==categoria_id)
+            .order_by(Producto.producto_id)
+            .limit(limit)
+            .offset(offset)
+        )).all()
+        if productos:
+            _cache_listados[clave] = productos
     if not productos:
         raise HTTPException(status_code=404, detail="No se encontraron productos para esta categoria")
     return productos
 
-@router.get("/activo/{activo}/", response_model=List[ProductoLeer])
+@router.get("/activo/{activo}/", response_model=List[ProductoLeer], response_model_exclude_none=True)
 async def leer_productos_por_estado(activo: bool, session: SessionDep):
     """
         Leer productos por estado activo.
@@ -235,13 +334,18 @@ async def leer_productos_por_estado(activo: bool, session: SessionDep):
         Raises:
             HTTPException: 404 si no se encuentran productos con ese estado.
         """
-    productos = session.query(Producto).filter(Producto.activo == activo).all()
+    clave = ("estado", activo)
+    productos = _cache_listados.get(clave)
+    if productos is None:
+        productos = (await session.exec(select(*_COLUMNAS_PRODUCTO).where(Producto.activo == activo))).all()
+        if productos:
+            _cache_listados[clave] = productos
     if not productos:
         raise HTTPException(status_code=404, detail="No se encontraron productos con este estado")
     return productos
 
 
-@router.get("/categoria/{categoria_id}/activo/{activo}/")
+@router.get("/categoria/{categoria_id}/activo/{activo}/", response_model=List[ProductoLeer], response_model_exclude_none=True)
 async def leer_productos_por_categoria_y_estado(categoria_id: int, activo: bool, session: SessionDep):
     """
         Leer productos por categoría y estado activo.
@@ -259,13 +363,50 @@ async def leer_productos_por_categoria_y_estado(categoria_id: int, activo: bool,
         Raises:
             HTTPException: 404 si no se encuentran productos que coincidan con los criterios.
         """
-    productos = session.query(Producto).filter(Producto.categoria_id==categoria_id, Producto.activo==activo).all()
+    clave = ("categoria_estado", categoria_id, activo)
+    productos = _cache_listados.get(clave)
+    if productos is None:
+        productos = (await session.exec(select(*_COLUMNAS_PRODUCTO).where(Producto.categoria_id==categoria_id, Producto.activo==activo))).all()
+        if productos:
+            _cache_listados[clave] = productos
     if not productos:
         raise HTTPException(status_code=404, detail="No se encontraron productos con estos criterios")
     return productos
 
 
-@router.put("/{producto_id}/", response_model=Producto)
+# La ruta genérica va al final para que las rutas con prefijo fijo se evalúen primero
+@router.get("/{producto_id}/", response_model=ProductoLeer, response_model_exclude_none=True)
+async def leer_producto_por_id(producto_id: int, session: SessionDep,
+                               request: Request, response: Response):
+    """
+        Leer un producto por ID.
+
+        Recupera un producto específico a partir de su identificador.
+
+        Args:
+            producto_id (int): ID del producto a consultar.
+            session (SessionDep): Dependencia que provee la sesión de la base de datos.
+
+        Returns:
+            Producto: Instancia del producto correspondiente.
+
+        Raises:
+            HTTPException: 404 si el producto no existe.
+        """
+    producto = (await session.exec(_STMT_PRODUCTO_POR_ID, params={"id": producto_id})).one_or_none()
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    # La propia fecha_actualizacion de la fila versiona la respuesta: en un hit
+    # de caché del cliente se ahorra la serialización y el cuerpo completo
+    etag = _etag_debil(producto_id, producto.fecha_actualizacion)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return producto
+
+
+@router.put("/{producto_id}/", response_model=ProductoLeer, response_model_exclude_none=True)
 async def actualizar_producto(producto_id: int,
                                 session: SessionDep,
                                 nombre: str = Form(None),
@@ -290,39 +431,51 @@ async def actualizar_producto(producto_id: int,
            stock (int | None): Nuevo valor de stock. Si es `None`, no se modifica.
 
        Returns:
-           Producto: Instancia del producto actualizada.
+           ProductoLeer: Esquema de lectura del producto actualizado.
 
        Raises:
            HTTPException: 400 si el stock es negativo.
+           HTTPException: 400 si no se envía ningún campo a actualizar.
            HTTPException: 404 si el producto no existe.
        """
     if stock is not None and stock < 0:
         raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
 
-    producto = session.get(Producto, producto_id)
-
-    if not producto:
+    actualizaciones = {
+        campo: valor
+        for campo, valor in (
+            ("nombre", nombre),
+            ("descripcion", descripcion),
+            ("activo", activo),
+            ("precio", precio),
+            ("stock", stock),
+        )
+        if valor is not None
+    }
+    if not actualizaciones:
+        raise HTTPException(status_code=400, detail="No se enviaron campos para actualizar")
+
+    actualizaciones["fecha_actualizacion"] = datetime.now(BOGOTA_TZ)
+
+    # UPDATE ... RETURNING devuelve la fila actualizada en el mismo viaje,
+    # sin SELECT previo ni refresh posterior
+    try:
+        producto = (await session.exec(
+            update(Producto)
+            .where(Producto.producto_id == producto_id)
+            .values(**actualizaciones)
+            .returning(*_COLUMNAS_PRODUCTO)
+        )).one_or_none()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="El producto con ese nombre ya existe")
+    if producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-
-    if nombre is not None:
-        producto.nombre = nombre
-    if descripcion is not None:
-        producto.descripcion = descripcion
-    if activo is not None:
-        producto.activo = activo
-    if precio is not None:
-        producto.precio = precio
-    if stock is not None:
-        producto.stock = stock
-
-    producto.fecha_actualizacion = datetime.now(timezone(timedelta(hours=-5)))
-
-    session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    await session.commit()
+    _cache_listados.clear()
     return producto
 
-@router.delete("/{producto_id}", response_model=ProductoLeer)
+@router.delete("/{producto_id}", response_model=ProductoLeer, response_model_exclude_none=True)
 async def eliminar_producto(producto_id: int, session: SessionDep):
     """
         Eliminar un producto.
@@ -339,16 +492,20 @@ async def eliminar_producto(producto_id: int, session: SessionDep):
         Raises:
             HTTPException: 404 si el producto no existe.
         """
-    producto = session.get(Producto, producto_id)
-    if not producto:
+    # Un solo UPDATE ... RETURNING en vez de SELECT + mutación + UPDATE.
+    # fecha_actualizacion se toca también aquí para que los ETags cambien
+    producto = (await session.exec(
+        update(Producto)
+        .where(Producto.producto_id == producto_id)
+        .values(eliminacion=False, activo=False, precio=0, stock=0,
+                fecha_actualizacion=datetime.now(BOGOTA_TZ))
+        .returning(*_COLUMNAS_PRODUCTO)
+    )).one_or_none()
+    if producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
-    producto.eliminacion = False
-    producto.activo = False
-    producto.precio = 0
-    producto.stock = 0
-
-    session.commit()
+    await session.commit()
+    _cache_listados.clear()
     return producto
 
 
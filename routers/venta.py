@@ -1,11 +1,14 @@
-from typing import List
-from sqlalchemy.orm import selectinload
-from sqlmodel import select
-from fastapi import APIRouter,HTTPException, Form
+from typing import List, Optional
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+from sqlmodel import select, insert, update
+from sqlalchemy import func
+from fastapi import APIRouter,HTTPException, Form, Query, Request, Response
+from datetime import datetime
 from db import SessionDep
+from routers.productos import _cache_listados, _etag_debil
 from modelos.categoria import Categoria
-from modelos.productos import Producto
-from modelos.venta import Venta, VentaItem, VentaResponse
+from modelos.productos import Producto, BOGOTA_TZ
+from modelos.venta import Venta, VentaItem, VentaItemCrear, VentaResponse, VentaPagina
 
 
 router = APIRouter(
@@ -13,7 +16,7 @@ router = APIRouter(
     tags=["ventas"],
 )
 
-@router.post("/", response_model=Venta)
+@router.post("/", response_model=Venta, response_model_exclude_none=True)
 async def crear_venta(session: SessionDep):
     """
         Crear una nueva venta.
@@ -33,16 +36,16 @@ async def crear_venta(session: SessionDep):
     nueva_venta = Venta()
 
     session.add(nueva_venta)
-    session.commit()
-    session.refresh(nueva_venta)
+    await session.commit()
+    await session.refresh(nueva_venta)
     return nueva_venta
 
-@router.post("/{venta_id}/items/", response_model=VentaItem)
+@router.post("/{venta_id}/items/", response_model=VentaItem, response_model_exclude_none=True)
 async def agregar_item_venta(
     venta_id: int,
+    session: SessionDep,
     producto_id: int = Form(...),
     cantidad: int = Form(...),
-    session: SessionDep = SessionDep(),
 ):
     """
         Agregar un ítem a una venta existente.
@@ -61,77 +64,194 @@ async def agregar_item_venta(
             VentaItem: Ítem de venta recién agregado con la información del producto y el precio unitario.
 
         Raises:
-            HTTPException: 404 si no se encuentran productos activos con categoría activa.
             HTTPException: 404 si la venta no existe.
             HTTPException: 404 si el producto no existe o está inactivo.
+            HTTPException: 400 si la categoría del producto está inactiva.
             HTTPException: 400 si el stock del producto es insuficiente.
         """
-    categoria = (
-        session.query(Producto)
-        .join(Categoria)
-        .filter(Producto.activo == True, Categoria.activo == True)
-        .all()
-    )
-    if not categoria:
-        raise HTTPException(status_code=404, detail="No se encontraron productos activos con categoría activa")
-
-    venta = session.get(Venta, venta_id)
-    if not venta:
-        raise HTTPException(status_code=404, detail="Venta no encontrada")
-
-    producto = session.get(Producto, producto_id)
-    if not producto or not producto.activo:
-        raise HTTPException(status_code=404, detail="Producto no encontrado o inactivo")
-
-    if producto.stock < cantidad:
-        raise HTTPException(status_code=400, detail="Stock insuficiente para el producto")
-
-    precio_unitario = producto.precio
-    nuevo_item = VentaItem(
-        venta_id=venta_id,
-        producto_id=producto_id,
-        cantidad=cantidad,
-        precio_unitario=precio_unitario,
-    )
+    async with session.begin():
+        fila = (await session.exec(
+            update(Producto)
+            .where(
+                Producto.producto_id == producto_id,
+                Producto.activo == True,
+                Producto.categoria.has(Categoria.activo == True),
+                Producto.stock >= cantidad,
+            )
+            .values(stock=Producto.stock - cantidad,
+                    fecha_actualizacion=datetime.now(BOGOTA_TZ))
+            .returning(Producto.precio)
+        )).first()
+        if fila is None:
+            # Sólo en la ruta de error se consulta el producto para distinguir el motivo
+            producto = await session.get(Producto, producto_id)
+            if not producto or not producto.activo:
+                raise HTTPException(status_code=404, detail="Producto no encontrado o inactivo")
+            categoria = await session.get(Categoria, producto.categoria_id)
+            if not categoria or not categoria.activo:
+                raise HTTPException(status_code=400, detail="La categoría está inactiva")
+            raise HTTPException(status_code=400, detail="Stock insuficiente para el producto")
+
+        precio_unitario = fila.precio
+        resultado = await session.exec(
+            update(Venta)
+            .where(Venta.venta_id == venta_id)
+            .values(total=Venta.total + precio_unitario * cantidad)
+        )
+        if resultado.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Venta no encontrada")
+
+        nuevo_item = VentaItem(
+            venta_id=venta_id,
+            producto_id=producto_id,
+            cantidad=cantidad,
+            precio_unitario=precio_unitario,
+        )
+        session.add(nuevo_item)
+    # El descuento de stock invalida los listados de productos cacheados
+    _cache_listados.clear()
+    await session.refresh(nuevo_item)
+    return nuevo_item
 
-    producto.stock -= cantidad
-    venta.total += precio_unitario * cantidad
+@router.post("/{venta_id}/items/bulk/", response_model=VentaResponse, response_model_exclude_none=True)
+async def agregar_items_venta(venta_id: int, items: List[VentaItemCrear], session: SessionDep):
+    """
+        Agregar varios ítems a una venta en una sola operación.
 
-    session.add(nuevo_item)
-    session.add(producto)
-    session.add(venta)
-    session.commit()
-    session.refresh(nuevo_item)
-    return nuevo_item
+        Inserta todos los ítems recibidos con un único INSERT por lotes, descuenta el
+        stock de cada producto y recalcula el total de la venta con una agregación SQL,
+        todo dentro de una misma transacción.
+
+        Args:
+            venta_id (int): ID de la venta a la que se agregarán los ítems.
+            items (List[VentaItemCrear]): Lista de ítems con producto y cantidad.
+            session (SessionDep): Dependencia que provee la sesión de la base de datos.
+
+        Returns:
+            VentaResponse: La venta con todos sus ítems y el total actualizado.
 
-@router.get("/", response_model=List[VentaResponse])
-async def leer_ventas(session: SessionDep):
+        Raises:
+            HTTPException: 400 si la lista de ítems está vacía.
+            HTTPException: 404 si la venta no existe.
+            HTTPException: 404 si algún producto no existe o está inactivo.
+            HTTPException: 400 si el stock de algún producto es insuficiente.
+        """
+    if not items:
+        raise HTTPException(status_code=400, detail="La venta debe incluir al menos un ítem")
+
+    async with session.begin():
+        venta = await session.get(Venta, venta_id)
+        if not venta:
+            raise HTTPException(status_code=404, detail="Venta no encontrada")
+
+        cantidades = {}
+        for item in items:
+            cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+
+        productos = (await session.exec(
+            select(Producto).where(Producto.producto_id.in_(cantidades), Producto.activo == True)
+        )).all()
+        productos_por_id = {producto.producto_id: producto for producto in productos}
+
+        for producto_id, cantidad in cantidades.items():
+            producto = productos_por_id.get(producto_id)
+            if not producto:
+                raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado o inactivo")
+            if producto.stock < cantidad:
+                raise HTTPException(status_code=400, detail=f"Stock insuficiente para el producto {producto_id}")
+
+        filas = [
+            {
+                "venta_id": venta_id,
+                "producto_id": item.producto_id,
+                "cantidad": item.cantidad,
+                "precio_unitario": productos_por_id[item.producto_id].precio,
+            }
+            for item in items
+        ]
+        # executemany: una sola ida a la base por lote para los ítems
+        await session.exec(insert(VentaItem), params=filas)
+
+        # Descuento atómico por producto: el guard de stock viaja en el propio
+        # UPDATE, igual que en el endpoint de ítem único, para que dos ventas
+        # concurrentes no pisen el mismo stock leído y sobrevendan
+        for producto_id, cantidad in cantidades.items():
+            resultado = await session.exec(
+                update(Producto)
+                .where(Producto.producto_id == producto_id, Producto.stock >= cantidad)
+                .values(stock=Producto.stock - cantidad,
+                        fecha_actualizacion=datetime.now(BOGOTA_TZ))
+            )
+            if resultado.rowcount == 0:
+                raise HTTPException(status_code=400, detail=f"Stock insuficiente para el producto {producto_id}")
+
+        total = (await session.exec(
+            select(func.sum(VentaItem.cantidad * VentaItem.precio_unitario)).where(VentaItem.venta_id == venta_id)
+        )).one()
+        await session.exec(update(Venta).where(Venta.venta_id == venta_id).values(total=total))
+
+    # Los descuentos de stock invalidan los listados de productos cacheados
+    _cache_listados.clear()
+    query = (
+        select(Venta)
+        .options(selectinload(Venta.items).joinedload(VentaItem.producto), raiseload("*"))
+        .where(Venta.venta_id == venta_id)
+    )
+    return (await session.exec(query)).first()
+
+@router.get("/", response_model=VentaPagina, response_model_exclude_none=True)
+async def leer_ventas(session: SessionDep,
+                      request: Request,
+                      response: Response,
+                      cursor: Optional[int] = None,
+                      limit: int = Query(50, le=200)):
     """
-        Leer todas las ventas registradas.
+        Leer las ventas registradas, paginadas por cursor.
 
-        Obtiene la lista completa de ventas con sus ítems asociados y los detalles de cada producto.
+        Devuelve una página de ventas (de la más reciente a la más antigua) con sus ítems
+        asociados y los detalles de cada producto. Para obtener la página siguiente se debe
+        repetir la petición pasando el `next_cursor` devuelto; la paginación por cursor evita
+        el costo creciente de OFFSET en páginas profundas.
 
         Args:
             session (SessionDep): Dependencia que provee la sesión de la base de datos.
+            cursor (Optional[int]): Último `venta_id` visto; solo se devuelven ventas anteriores.
+            limit (int): Cantidad máxima de ventas por página (máximo 200).
 
         Returns:
-            List[VentaResponse]: Lista de ventas con los productos e ítems asociados.
+            VentaPagina: Página de ventas y el cursor para la página siguiente, si la hay.
 
         Raises:
             HTTPException: 404 si no se encuentran ventas registradas.
         """
+    # Agregado barato que versiona el listado: cantidad de ventas, última venta y
+    # suma de totales (esta última cambia cuando se agregan ítems a una venta ya
+    # existente). En un hit de If-None-Match se responde 304 sin la consulta completa
+    agregado = (await session.exec(
+        select(func.count(), func.max(Venta.venta_id), func.coalesce(func.sum(Venta.total), 0))
+    )).one()
+    etag = _etag_debil(cursor, limit, *agregado)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     query = (
         select(Venta)
-        .options(selectinload(Venta.items).selectinload(VentaItem.producto))
+        .options(selectinload(Venta.items).joinedload(VentaItem.producto), raiseload("*"))
+        .order_by(Venta.venta_id.desc())
+        .limit(limit)
     )
-    ventas = session.exec(query).all()
+    if cursor is not None:
+        query = query.where(Venta.venta_id < cursor)
+    ventas = (await session.exec(query)).all()
 
     if not ventas:
         raise HTTPException(status_code=404, detail="No se encontraron ventas")
 
-    return ventas
+    next_cursor = ventas[-1].venta_id if len(ventas) == limit else None
+    return VentaPagina(items=ventas, next_cursor=next_cursor)
 
-@router.get("/{venta_id}/", response_model=List[VentaResponse])
+@router.get("/{venta_id}/", response_model=List[VentaResponse], response_model_exclude_none=True)
 async def leer_venta(session: SessionDep, venta_id: int):
     """
         Leer una venta por ID.
@@ -150,10 +270,10 @@ async def leer_venta(session: SessionDep, venta_id: int):
         """
     query = (
         select(Venta)
-        .options(selectinload(Venta.items).selectinload(VentaItem.producto))
+        .options(selectinload(Venta.items).joinedload(VentaItem.producto), raiseload("*"))
         .where(Venta.venta_id == venta_id)
     )
-    ventas = session.exec(query).all()
+    ventas = (await session.exec(query)).all()
 
     if not ventas:
         raise HTTPException(status_code=404, detail="No se encontraron ventas")
@@ -0,0 +1,70 @@
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Valores ficticios para que db.py pueda construir la URL al importarse
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("DB_NAME", "test")
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import db
+
+
+@pytest.fixture()
+def engine():
+    """Engine SQLite en memoria que reemplaza al engine PostgreSQL de la app."""
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    original_engine, original_factory = db.engine, db.session_factory
+    db.engine = engine
+    db.session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    yield engine
+    db.engine, db.session_factory = original_engine, original_factory
+
+
+@pytest.fixture()
+def client(engine):
+    from fastapi.testclient import TestClient
+    from main import app
+    from routers.productos import _cache_listados
+
+    # Cada test parte de una base vacía; el caché de listados no debe arrastrar
+    # resultados de un test anterior
+    _cache_listados.clear()
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture()
+def count_queries(engine):
+    """Context manager que acumula las sentencias SQL emitidas por el engine."""
+
+    @contextmanager
+    def contador():
+        sentencias = []
+
+        def _registrar(conn, cursor, statement, parameters, context, executemany):
+            sentencias.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", _registrar)
+        try:
+            yield sentencias
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", _registrar)
+
+    return contador
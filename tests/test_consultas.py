@@ -0,0 +1,30 @@
+def _crear_datos(client):
+    client.post("/categorias/", data={"nombre": "ropa", "descripcion": "textil"})
+    client.post("/productos/", data={"nombre": "camisa", "precio": 10, "stock": 5, "categoria_id": 1})
+    client.post("/productos/", data={"nombre": "pantalon", "precio": 20, "stock": 3, "categoria_id": 1})
+
+
+def test_categoria_con_productos_consultas_acotadas(client, count_queries):
+    _crear_datos(client)
+    with count_queries() as sentencias:
+        respuesta = client.get("/categorias/1/productos/")
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()["productos"]) == 2
+    # 1 SELECT por la categoría + 1 selectinload de productos + 1 de categorías anidadas
+    assert len(sentencias) <= 3
+
+
+def test_leer_ventas_consultas_acotadas(client, count_queries):
+    _crear_datos(client)
+    client.post("/ventas/")
+    client.post("/ventas/1/items/", data={"producto_id": 1, "cantidad": 2})
+    client.post("/ventas/1/items/", data={"producto_id": 2, "cantidad": 1})
+    with count_queries() as sentencias:
+        respuesta = client.get("/ventas/")
+    assert respuesta.status_code == 200
+    pagina = respuesta.json()
+    assert pagina.get("next_cursor") is None
+    assert len(pagina["items"][0]["items"]) == 2
+    # 1 SELECT por las ventas + 1 selectinload de ítems con su producto unido;
+    # la serialización no debe disparar consultas extra por ítem (N+1)
+    assert len(sentencias) <= 3
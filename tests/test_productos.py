@@ -0,0 +1,15 @@
+def _crear_datos(client):
+    client.post("/categorias/", data={"nombre": "ropa", "descripcion": "textil"})
+    client.post("/productos/", data={"nombre": "camisa", "precio": 10, "stock": 5, "categoria_id": 1})
+    client.post("/productos/", data={"nombre": "pantalon", "precio": 20, "stock": 3, "categoria_id": 1})
+
+
+def test_leer_productos_por_categoria_y_estado_serializa(client):
+    # Regresión: las filas proyectadas (Row) no son serializables sin
+    # response_model y el endpoint respondía 500
+    _crear_datos(client)
+    respuesta = client.get("/productos/categoria/1/activo/true/")
+    assert respuesta.status_code == 200
+    productos = respuesta.json()
+    assert len(productos) == 2
+    assert {producto["nombre"] for producto in productos} == {"camisa", "pantalon"}